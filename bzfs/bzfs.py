@@ -45,6 +45,7 @@ import uuid
 from collections import defaultdict, Counter
 from contextlib import redirect_stderr
 from datetime import datetime, timedelta
+from functools import lru_cache
 from logging import Logger
 from pathlib import Path
 from subprocess import CalledProcessError, TimeoutExpired
@@ -54,11 +55,20 @@ __version__ = "1.2.0-dev"
 prog_name = "bzfs"
 prog_author = "Wolfgang Hoschek"
 die_status = 3
-if sys.version_info < (3, 7):
-    print(f"ERROR: {prog_name} requires Python version >= 3.7!", file=sys.stderr)
-    sys.exit(die_status)
+
+
+def validate_python_version(version_info: Tuple) -> None:
+    if version_info < (3, 7):
+        print(f"ERROR: {prog_name} requires Python version >= 3.7!", file=sys.stderr)
+        sys.exit(die_status)
+
+
+validate_python_version(sys.version_info)
 exclude_dataset_regexes_default = r"(.*/)?[Tt][Ee]?[Mm][Pp][-_]?[0-9]*"  # skip tmp datasets by default
 disable_prg = "-"
+capturing_group_regex = re.compile(r"(?<!\\)\((?=[^?])")  # '(' not preceded by backslash and followed by non-'?'
+log_config_variable_regex = re.compile(r"[^\s${}'\":]+:")  # NAME:VALUE where NAME has no whitespace or ${}'" chars
+solaris_raw_mode_aliases = {"--raw": "-w", "--compressed": "compress"}
 env_var_prefix = prog_name + "_"
 zfs_version_is_at_least_2_1_0 = "zfs>=2.1.0"
 zfs_recv_groups = {"zfs_recv_o": "-o", "zfs_recv_x": "-x", "zfs_set": ""}
@@ -70,6 +80,7 @@ PIPE = subprocess.PIPE
 
 
 # fmt: off
+@lru_cache(maxsize=1)  # building the parser is expensive, and argparse doesn't mutate it during parse_args()
 def argument_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         prog=prog_name,
@@ -797,6 +808,7 @@ class LogParams:
         os.makedirs(self.log_dir, exist_ok=True)
         fd, self.log_file = tempfile.mkstemp(suffix=".log", prefix=f"{self.timestamp}_", dir=self.log_dir)
         os.close(fd)
+        self.abs_log_file: str = os.path.abspath(self.log_file)
         fd, self.pv_log_file = tempfile.mkstemp(suffix=".pv", prefix=f"{self.timestamp}_", dir=self.log_dir)
         os.close(fd)
         create_symlink(self.log_file, self.log_dir, "current.log")
@@ -2589,16 +2601,15 @@ class Job:
         """Extracts -o and -x property names that are already specified on the command line. This can be used to check
         for dupes because 'zfs receive' does not accept multiple -o or -x options with the same property name."""
         propnames = set()
-        i = 0
-        n = len(recv_opts)
-        while i < n:
-            stripped = recv_opts[i].strip()
+        opts = iter(recv_opts)
+        for opt in opts:
+            stripped = opt.strip()
             if stripped in {"-o", "-x"}:
-                i += 1
-                if i == n or recv_opts[i].strip() in {"-o", "-x"}:
+                value = next(opts, None)  # consume the value of the option
+                if value is None or value.strip() in {"-o", "-x"}:
                     die(f"Missing value for {stripped} option in --zfs-receive-program-opt(s): {' '.join(recv_opts)}")
-                propnames.add(recv_opts[i] if stripped == "-x" else recv_opts[i].split("=", 1)[0])
-            i += 1
+                assert value is not None
+                propnames.add(value if stripped == "-x" else value.partition("=")[0])
         return propnames
 
     def is_program_available(self, program: str, location: str) -> bool:
@@ -2856,8 +2867,7 @@ def fix_send_recv_opts(
 
 
 def fix_solaris_raw_mode(lst: List[str]) -> List[str]:
-    lst = ["-w" if opt == "--raw" else opt for opt in lst]
-    lst = ["compress" if opt == "--compressed" else opt for opt in lst]
+    lst = [solaris_raw_mode_aliases.get(opt, opt) for opt in lst]
     i = lst.index("-w") if "-w" in lst else -1
     if i >= 0:
         i += 1
@@ -2924,16 +2934,19 @@ def is_included(name: str, include_regexes: RegexList, exclude_regexes: RegexLis
 
 
 def compile_regexes(regexes: List[str], suffix: str = "") -> RegexList:
-    compiled_regexes = []
-    for regex in regexes:
-        is_negation = regex.startswith("!")
-        if is_negation:
-            regex = regex[1:]
-        regex = replace_capturing_groups_with_non_capturing_groups(regex)
-        if regex != ".*" or not (suffix.startswith("(") and suffix.endswith(")?")):
-            regex = f"{regex}{suffix}"
-        compiled_regexes.append((re.compile(regex), is_negation))
-    return compiled_regexes
+    return [compile_regex(regex, suffix) for regex in regexes]
+
+
+@lru_cache(maxsize=1024)
+def compile_regex(regex: str, suffix: str = "") -> Tuple[re.Pattern, bool]:
+    """Memoized as the same patterns are compiled again for each job, task and CopyPropertiesConfig."""
+    is_negation = regex.startswith("!")
+    if is_negation:
+        regex = regex[1:]
+    regex = replace_capturing_groups_with_non_capturing_groups(regex)
+    if regex != ".*" or not (suffix.startswith("(") and suffix.endswith(")?")):
+        regex = f"{regex}{suffix}"
+    return re.compile(regex), is_negation
 
 
 def replace_capturing_groups_with_non_capturing_groups(regex: str) -> str:
@@ -2943,15 +2956,7 @@ def replace_capturing_groups_with_non_capturing_groups(regex: str) -> str:
     with the replacement string '(?:'
     Also see https://docs.python.org/3/howto/regex.html#non-capturing-and-named-groups
     """
-    # pattern = re.compile(r'(?<!\\)\((?!\?)')
-    # return pattern.sub('(?:', regex)
-    i = len(regex) - 2
-    while i >= 0:
-        i = regex.rfind("(", 0, i + 1)
-        if i >= 0 and regex[i] == "(" and (regex[i + 1] != "?") and (i == 0 or regex[i - 1] != "\\"):
-            regex = f"{regex[0:i]}(?:{regex[i + 1:]}"
-        i -= 1
-    return regex
+    return capturing_group_regex.sub("(?:", regex)
 
 
 def isorted(iterable: Iterable[str], reverse: bool = False) -> List[str]:
@@ -3053,24 +3058,30 @@ def parse_dataset_locator(input_text: str, validate: bool = True, user: str = No
     user_host, dataset, pool = "", "", ""
 
     # Input format is [[user@]host:]dataset
-    #                      1234         5          6
-    match = re.fullmatch(r"(((([^@]*)@)?([^:]+)):)?(.*)", input_text, re.DOTALL)
-    if match:
-        if user_undefined:
-            user = match.group(4) or ""
-        if host_undefined:
-            host = match.group(5) or ""
-            host = convert_ipv6(host)
-        if host == "-":
-            host = ""
-        dataset = match.group(6) or ""
-        i = dataset.find("/")
-        pool = dataset[0:i] if i >= 0 else dataset
-
-        if user and host:
-            user_host = f"{user}@{host}"
-        elif host:
-            user_host = host
+    # Same semantics as re.fullmatch(r"(((([^@]*)@)?([^:]+)):)?(.*)", input_text, re.DOTALL) but in a single pass:
+    # user must not contain '@' and host must be non-empty and must not contain ':'
+    parsed_user, parsed_host, dataset = "", "", input_text
+    i = input_text.find("@")
+    j = input_text.find(":", i + 1)
+    if i >= 0 and j > i + 1:
+        parsed_user, parsed_host, dataset = input_text[0:i], input_text[i + 1 : j], input_text[j + 1 :]
+    else:
+        j = input_text.find(":")
+        if j > 0:
+            parsed_host, dataset = input_text[0:j], input_text[j + 1 :]
+    if user_undefined:
+        user = parsed_user
+    if host_undefined:
+        host = convert_ipv6(parsed_host)
+    if host == "-":
+        host = ""
+    i = dataset.find("/")
+    pool = dataset[0:i] if i >= 0 else dataset
+
+    if user and host:
+        user_host = f"{user}@{host}"
+    elif host:
+        user_host = host
 
     if validate:
         validate_user_name(user, input_text)
@@ -3192,7 +3203,7 @@ def get_default_logger(log_params: LogParams, args: argparse.Namespace) -> Logge
         handler.setLevel(log_params.log_level)
         log.addHandler(handler)
 
-    abs_log_file = os.path.abspath(log_params.log_file)
+    abs_log_file = log_params.abs_log_file
     if not any(isinstance(h, logging.FileHandler) and h.baseFilename == abs_log_file for h in sublog.handlers):
         handler = logging.FileHandler(log_params.log_file, encoding="utf-8")
         handler.setFormatter(get_default_log_formatter())
@@ -3224,6 +3235,10 @@ def get_default_logger(log_params: LogParams, args: argparse.Namespace) -> Logge
 
 
 def get_default_log_formatter(prefix: str = "") -> logging.Formatter:
+    return DefaultLogFormatter(prefix)
+
+
+class DefaultLogFormatter(logging.Formatter):
     level_prefixes = {
         logging.CRITICAL: "[C] CRITICAL:",
         logging.ERROR: "[E] ERROR:",
@@ -3232,29 +3247,29 @@ def get_default_log_formatter(prefix: str = "") -> logging.Formatter:
         logging.DEBUG: "[D]",
         log_trace: "[T]",
     }
-    _log_stderr = log_stderr
-    _log_stdout = log_stdout
-
-    class DefaultLogFormatter(logging.Formatter):
-        def format(self, record) -> str:
-            levelno = record.levelno
-            if levelno != _log_stderr and levelno != _log_stdout:  # emit stdout and stderr "as-is" (no formatting)
-                timestamp = datetime.now().isoformat(sep=" ", timespec="seconds")
-                ts_level = f"{timestamp} {level_prefixes.get(levelno, '')} "
-                msg = record.msg
-                i = msg.find("%s")
-                msg = ts_level + msg
-                if i >= 1:
-                    i += len(ts_level)
-                    msg = msg[0:i].ljust(53) + msg[i:]  # right-pad msg if record.msg contains "%s" unless at start
-                if record.args:
-                    msg = msg % record.args
-                return prefix + msg
-            return prefix + super().format(record)
-
-    return DefaultLogFormatter()
-
 
+    def __init__(self, prefix: str = ""):
+        super().__init__()
+        self.prefix = prefix
+
+    def format(self, record) -> str:
+        levelno = record.levelno
+        if levelno != log_stderr and levelno != log_stdout:  # emit stdout and stderr "as-is" (no formatting)
+            timestamp = datetime.now().isoformat(sep=" ", timespec="seconds")
+            ts_level = f"{timestamp} {self.level_prefixes.get(levelno, '')} "
+            msg = record.msg
+            i = msg.find("%s")
+            msg = ts_level + msg
+            if i >= 1:
+                i += len(ts_level)
+                msg = msg[0:i].ljust(53) + msg[i:]  # right-pad msg if record.msg contains "%s" unless at start
+            if record.args:
+                msg = msg % record.args
+            return self.prefix + msg
+        return self.prefix + super().format(record)
+
+
+@lru_cache(maxsize=64)
 def get_syslog_address(address: str, log_syslog_socktype: str) -> Tuple:
     socktype = None
     address = address.strip()
@@ -3332,7 +3347,9 @@ def get_dict_config_logger(log_params: LogParams, args: argparse.Namespace) -> L
     return logging.getLogger(get_logger_subname())
 
 
-def validate_log_config_variable(var: str) -> str:
+def validate_log_config_variable(var: str) -> Optional[str]:
+    if log_config_variable_regex.match(var):
+        return None  # fast path for the common case of a valid variable; the checks below produce the error messages
     if not var.strip():
         return "Invalid log config NAME:VALUE variable. Variable must not be empty: " + var
     if ":" not in var:
@@ -3399,10 +3416,9 @@ class DatasetPairsAction(argparse.Action):
                         for line in fd.read().splitlines():
                             if not line.strip() or line.startswith("#"):
                                 continue  # skip empty lines and comment lines
-                            splits = line.split("\t", 1)
-                            if len(splits) <= 1:
+                            src_root_dataset, separator, dst_root_dataset = line.partition("\t")
+                            if not separator:
                                 parser.error("Line must contain tab-separated SRC_DATASET and DST_DATASET: " + line)
-                            src_root_dataset, dst_root_dataset = splits
                             if not src_root_dataset.strip() or not dst_root_dataset.strip():
                                 parser.error("SRC_DATASET and DST_DATASET must not be empty or whitespace-only:" + line)
                             datasets.append(src_root_dataset)
@@ -3419,9 +3435,7 @@ class DatasetPairsAction(argparse.Action):
 #############################################################################
 class FileOrLiteralAction(argparse.Action):
     def __call__(self, parser, namespace, values, option_string=None):
-        current_values = getattr(namespace, self.dest, None)
-        if current_values is None:
-            current_values = []
+        current_values = list(getattr(namespace, self.dest, None) or [])  # copy, so as not to mutate the shared default
         for value in values:
             if not value.startswith("+"):
                 current_values.append(value)
@@ -3485,9 +3499,7 @@ class TimestampAction(argparse.Action):
 #############################################################################
 class LogConfigVariablesAction(argparse.Action):
     def __call__(self, parser, namespace, values, option_string=None):
-        current_values = getattr(namespace, self.dest, None)
-        if current_values is None:
-            current_values = []
+        current_values = list(getattr(namespace, self.dest, None) or [])  # copy, so as not to mutate the shared default
         for variable in values:
             error_msg = validate_log_config_variable(variable)
             if error_msg:
@@ -17,6 +17,7 @@
 import argparse
 import itertools
 import logging
+import operator
 import os
 import re
 import socket
@@ -25,36 +26,61 @@ import tempfile
 import time
 import unittest
 from collections import defaultdict
-from contextlib import contextmanager
 from datetime import datetime, timedelta
-from pathlib import Path
-from typing import Sequence, Callable, Optional, TypeVar, Union
-from unittest.mock import patch, mock_open
+from typing import Any, Dict, Sequence, Callable, Optional, TypeVar, Union
+from unittest.mock import patch
 
 from bzfs import bzfs
+from tests import zfs_util
 from tests.zfs_util import is_solaris_zfs
 
 
 def suite():
+    test_cases = [
+        TestHelperFunctions,
+        TestParseDatasetLocator,
+        TestReplaceCapturingGroups,
+        TestFindMatch,
+        TestArgumentParser,
+        TestDatasetPairsAction,
+        TestFileOrLiteralAction,
+        TestTimestampAction,
+        TestLogConfigVariablesAction,
+        TestCheckRange,
+        TestPythonVersionCheck,
+        TestZfsUtilLibzfsCore,
+        ExcludeSnapshotRegexValidationCase,
+    ]
+    loader = unittest.TestLoader()
     suite = unittest.TestSuite()
-    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestHelperFunctions))
-    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestParseDatasetLocator))
-    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestReplaceCapturingGroups))
-    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestFindMatch))
-    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestArgumentParser))
-    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestDatasetPairsAction))
-    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestFileOrLiteralAction))
-    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestTimestampAction))
-    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestLogConfigVariablesAction))
-    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestCheckRange))
-    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(TestPythonVersionCheck))
-    suite.addTests(unittest.TestLoader().loadTestsFromTestCase(ExcludeSnapshotRegexValidationCase))
+    for test_case in test_cases:
+        suite.addTests(loader.loadTestsFromTestCase(test_case))
     return suite
 
 
 #############################################################################
 class TestHelperFunctions(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        cls.parser = bzfs.argument_parser()
+        cls.base_args = cls.parser.parse_args(args=["src", "dst"])
+        cls.root_logger = logging.getLogger()
+        cls.tmp_dir = tempfile.TemporaryDirectory(prefix="test_bzfs.")  # shared by tests; each uses its own paths
+        cls.tail_file = os.path.join(cls.tmp_dir.name, "tail")  # read-only fixture shared by tests
+        with open(cls.tail_file, "w", encoding="utf-8") as fd:
+            fd.write("line1\nline2\n")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def new_args(self) -> argparse.Namespace:
+        return argparse.Namespace(**vars(self.base_args))  # copy, so tests can mutate attrs without side effects
+
+    def new_params(self) -> bzfs.Params:
+        return bzfs.Params(self.new_args())
+
     def test_append_if_absent(self):
         self.assertListEqual([], bzfs.append_if_absent([]))
         self.assertListEqual(["a"], bzfs.append_if_absent([], "a"))
@@ -69,6 +95,22 @@ class TestHelperFunctions(unittest.TestCase):
         with self.assertRaises(ValueError):
             bzfs.cut(0, lines=lines)
 
+    def test_compile_regexes(self):
+        self.assertListEqual([], bzfs.compile_regexes([]))
+        regexes = bzfs.compile_regexes(["foo", "!(bar)"])
+        self.assertEqual(2, len(regexes))
+        self.assertEqual("foo", regexes[0][0].pattern)
+        self.assertFalse(regexes[0][1])
+        self.assertEqual("(?:bar)", regexes[1][0].pattern)
+        self.assertTrue(regexes[1][1])
+        self.assertEqual("foo(?:/.*)?", bzfs.compile_regexes(["foo"], suffix="(?:/.*)?")[0][0].pattern)
+        self.assertEqual(".*", bzfs.compile_regexes([".*"], suffix="(?:/.*)?")[0][0].pattern)
+        hits = bzfs.compile_regex.cache_info().hits
+        self.assertIs(regexes[0][0], bzfs.compile_regexes(["foo"])[0][0])
+        self.assertEqual(hits + 1, bzfs.compile_regex.cache_info().hits)  # memoized
+        with self.assertRaises(re.error):
+            bzfs.compile_regexes(["(xxx"])
+
     def test_get_home_directory(self):
         old_home = os.environ.get("HOME")
         if old_home is not None:
@@ -80,15 +122,12 @@ class TestHelperFunctions(unittest.TestCase):
                 os.environ["HOME"] = old_home
 
     def test_tail(self):
-        fd, file = tempfile.mkstemp(prefix="test_bzfs.tail_")
-        os.write(fd, "line1\nline2\n".encode())
-        os.close(fd)
+        file = self.tail_file
         self.assertEqual(["line1\n", "line2\n"], list(bzfs.tail(file, n=10)))
         self.assertEqual(["line1\n", "line2\n"], list(bzfs.tail(file, n=2)))
         self.assertEqual(["line2\n"], list(bzfs.tail(file, n=1)))
         self.assertEqual([], list(bzfs.tail(file, n=0)))
-        os.remove(file)
-        self.assertEqual([], list(bzfs.tail(file, n=2)))
+        self.assertEqual([], list(bzfs.tail(os.path.join(self.tmp_dir.name, "tail_missing"), n=2)))
 
     def test_validate_port(self):
         bzfs.validate_port(47, "msg")
@@ -99,106 +138,126 @@ class TestHelperFunctions(unittest.TestCase):
             bzfs.validate_port("xxx47", "msg")
 
     def test_validate_quoting(self):
-        params = bzfs.Params(bzfs.argument_parser().parse_args(args=["src", "dst"]))
-        params.validate_quoting([""])
-        params.validate_quoting(["foo"])
-        with self.assertRaises(SystemExit):
-            params.validate_quoting(['foo"'])
-        with self.assertRaises(SystemExit):
-            params.validate_quoting(["foo'"])
-        with self.assertRaises(SystemExit):
-            params.validate_quoting(["foo`"])
+        params = self.new_params()
+        cases = [  # (arg, is_valid)
+            ("", True),
+            ("foo", True),
+            ('foo"', False),
+            ("foo'", False),
+            ("foo`", False),
+        ]
+        for arg, is_valid in cases:
+            with self.subTest(arg=arg):
+                if is_valid:
+                    params.validate_quoting([arg])
+                else:
+                    with self.assertRaises(SystemExit):
+                        params.validate_quoting([arg])
 
     def test_validate_arg(self):
-        params = bzfs.Params(bzfs.argument_parser().parse_args(args=["src", "dst"]))
-        params.validate_arg("")
-        params.validate_arg("foo")
-        with self.assertRaises(SystemExit):
-            params.validate_arg("foo ")
-        with self.assertRaises(SystemExit):
-            params.validate_arg("foo" + "\t")
-        with self.assertRaises(SystemExit):
-            params.validate_arg("foo" + "\t", allow_spaces=True)
-        params.validate_arg("foo bar", allow_spaces=True)
-        with self.assertRaises(SystemExit):
-            params.validate_arg(" foo  bar ", allow_spaces=False)
-        params.validate_arg(" foo  bar ", allow_spaces=True)
-        with self.assertRaises(SystemExit):
-            params.validate_arg("foo'bar")
-        params.validate_arg("foo'bar", allow_all=True)
-        with self.assertRaises(SystemExit):
-            params.validate_arg('foo"bar')
-        params.validate_arg('foo"bar', allow_all=True)
-        with self.assertRaises(SystemExit):
-            params.validate_arg("foo\tbar")
-        params.validate_arg("foo\tbar", allow_all=True)
-        with self.assertRaises(SystemExit):
-            params.validate_arg("foo`bar")
-        params.validate_arg("foo`bar", allow_all=True)
-        with self.assertRaises(SystemExit):
-            params.validate_arg("foo\nbar")
-        params.validate_arg("foo\nbar", allow_all=True)
-        with self.assertRaises(SystemExit):
-            params.validate_arg("foo\rbar")
-        params.validate_arg("foo\rbar", allow_all=True)
-        params.validate_arg(" foo  bar ", allow_all=True)
+        params = self.new_params()
+        cases = [  # (arg, kwargs, is_valid)
+            ("", {}, True),
+            ("foo", {}, True),
+            ("foo ", {}, False),
+            ("foo\t", {}, False),
+            ("foo\t", {"allow_spaces": True}, False),
+            ("foo bar", {"allow_spaces": True}, True),
+            (" foo  bar ", {"allow_spaces": False}, False),
+            (" foo  bar ", {"allow_spaces": True}, True),
+            ("foo'bar", {}, False),
+            ("foo'bar", {"allow_all": True}, True),
+            ('foo"bar', {}, False),
+            ('foo"bar', {"allow_all": True}, True),
+            ("foo\tbar", {}, False),
+            ("foo\tbar", {"allow_all": True}, True),
+            ("foo`bar", {}, False),
+            ("foo`bar", {"allow_all": True}, True),
+            ("foo\nbar", {}, False),
+            ("foo\nbar", {"allow_all": True}, True),
+            ("foo\rbar", {}, False),
+            ("foo\rbar", {"allow_all": True}, True),
+            (" foo  bar ", {"allow_all": True}, True),
+        ]
+        for arg, kwargs, is_valid in cases:
+            with self.subTest(arg=arg, **kwargs):
+                if is_valid:
+                    params.validate_arg(arg, **kwargs)
+                else:
+                    with self.assertRaises(SystemExit):
+                        params.validate_arg(arg, **kwargs)
 
     def test_validate_program_name_must_not_be_empty(self):
-        args = bzfs.argument_parser().parse_args(args=["src", "dst"])
+        args = self.new_args()
         setattr(args, "zfs_program", "")
         with self.assertRaises(SystemExit):
             bzfs.Params(args)
 
     def test_split_args(self):
-        params = bzfs.Params(bzfs.argument_parser().parse_args(args=["src", "dst"]))
-        self.assertEqual([], params.split_args(""))
-        self.assertEqual([], params.split_args("  "))
-        self.assertEqual(["foo", "bar", "baz"], params.split_args("foo  bar baz"))
-        self.assertEqual(["foo", "bar", "baz"], params.split_args(" foo  bar\tbaz "))
-        self.assertEqual(["foo", "bar", "baz"], params.split_args("foo", "bar", "baz"))
-        self.assertEqual(["foo", "baz"], params.split_args("foo", "", "baz"))
-        self.assertEqual(["foo", "bar", "baz"], params.split_args("foo", ["bar", "", "baz"]))
-        self.assertEqual(["foo"], params.split_args("foo", []))
-        with self.assertRaises(SystemExit):
-            params.split_args("'foo'")
-        self.assertEqual(["'foo'"], params.split_args("'foo'", allow_all=True))
-        with self.assertRaises(SystemExit):
-            params.split_args('"foo"')
-        self.assertEqual(['"foo"'], params.split_args('"foo"', allow_all=True))
-        self.assertEqual(["foo", "bar baz"], params.split_args("foo", "bar baz"))
-        self.assertEqual(["foo", "bar\tbaz"], params.split_args("foo", "bar\tbaz"))
-        self.assertEqual(["foo", "bar\nbaz"], params.split_args("foo", "bar\nbaz"))
-        self.assertEqual(["foo", "bar\rbaz"], params.split_args("foo", "bar\rbaz"))
+        params = self.new_params()
+        cases = [  # (expected, args, kwargs); expected is None if SystemExit is expected
+            ([], ("",), {}),
+            ([], ("  ",), {}),
+            (["foo", "bar", "baz"], ("foo  bar baz",), {}),
+            (["foo", "bar", "baz"], (" foo  bar\tbaz ",), {}),
+            (["foo", "bar", "baz"], ("foo", "bar", "baz"), {}),
+            (["foo", "baz"], ("foo", "", "baz"), {}),
+            (["foo", "bar", "baz"], ("foo", ["bar", "", "baz"]), {}),
+            (["foo"], ("foo", []), {}),
+            (None, ("'foo'",), {}),
+            (["'foo'"], ("'foo'",), {"allow_all": True}),
+            (None, ('"foo"',), {}),
+            (['"foo"'], ('"foo"',), {"allow_all": True}),
+            (["foo", "bar baz"], ("foo", "bar baz"), {}),
+            (["foo", "bar\tbaz"], ("foo", "bar\tbaz"), {}),
+            (["foo", "bar\nbaz"], ("foo", "bar\nbaz"), {}),
+            (["foo", "bar\rbaz"], ("foo", "bar\rbaz"), {}),
+        ]
+        for expected, args, kwargs in cases:
+            with self.subTest(args=args, **kwargs):
+                if expected is None:
+                    with self.assertRaises(SystemExit):
+                        params.split_args(*args, **kwargs)
+                else:
+                    self.assertEqual(expected, params.split_args(*args, **kwargs))
 
     def test_fix_send_recv_opts(self):
-        params = bzfs.Params(bzfs.argument_parser().parse_args(args=["src", "dst"]))
-        self.assertEqual([], params.fix_recv_opts(["-n"]))
-        self.assertEqual([], params.fix_recv_opts(["--dryrun", "-n"]))
-        self.assertEqual([""], params.fix_recv_opts([""]))
-        self.assertEqual([], params.fix_recv_opts([]))
-        self.assertEqual(["-"], params.fix_recv_opts(["-"]))
-        self.assertEqual(["-h"], params.fix_recv_opts(["-hn"]))
-        self.assertEqual(["-h"], params.fix_recv_opts(["-nh"]))
-        self.assertEqual(["--Fvhn"], params.fix_recv_opts(["--Fvhn"]))
-        self.assertEqual(["foo"], params.fix_recv_opts(["foo"]))
-        self.assertEqual(["v", "n", "F"], params.fix_recv_opts(["v", "n", "F"]))
-        self.assertEqual(["-o", "-n"], params.fix_recv_opts(["-o", "-n"]))
-        self.assertEqual(["-o", "-n"], params.fix_recv_opts(["-o", "-n", "-n"]))
-        self.assertEqual(["-x", "--dryrun"], params.fix_recv_opts(["-x", "--dryrun"]))
-        self.assertEqual(["-x", "--dryrun"], params.fix_recv_opts(["-x", "--dryrun", "-n"]))
-        self.assertEqual(["-x"], params.fix_recv_opts(["-x"]))
-
-        self.assertEqual([], params.fix_send_opts(["-n"]))
-        self.assertEqual([], params.fix_send_opts(["--dryrun", "-n", "-ed"]))
-        self.assertEqual([], params.fix_send_opts(["-I", "s1"]))
-        self.assertEqual(["--raw"], params.fix_send_opts(["-i", "s1", "--raw"]))
-        self.assertEqual(["-X", "d1,d2"], params.fix_send_opts(["-X", "d1,d2"]))
-        self.assertEqual(
-            ["--exclude", "d1,d2", "--redact", "b1"], params.fix_send_opts(["--exclude", "d1,d2", "--redact", "b1"])
-        )
+        params = self.new_params()
+        recv_cases = [  # (expected, opts)
+            ([], ["-n"]),
+            ([], ["--dryrun", "-n"]),
+            ([""], [""]),
+            ([], []),
+            (["-"], ["-"]),
+            (["-h"], ["-hn"]),
+            (["-h"], ["-nh"]),
+            (["--Fvhn"], ["--Fvhn"]),
+            (["foo"], ["foo"]),
+            (["v", "n", "F"], ["v", "n", "F"]),
+            (["-o", "-n"], ["-o", "-n"]),
+            (["-o", "-n"], ["-o", "-n", "-n"]),
+            (["-x", "--dryrun"], ["-x", "--dryrun"]),
+            (["-x", "--dryrun"], ["-x", "--dryrun", "-n"]),
+            (["-x"], ["-x"]),
+        ]
+        for expected, opts in recv_cases:
+            with self.subTest(recv_opts=opts):
+                self.assertEqual(expected, params.fix_recv_opts(opts))
+
+        send_cases = [  # (expected, opts)
+            ([], ["-n"]),
+            ([], ["--dryrun", "-n", "-ed"]),
+            ([], ["-I", "s1"]),
+            (["--raw"], ["-i", "s1", "--raw"]),
+            (["-X", "d1,d2"], ["-X", "d1,d2"]),
+            (["--exclude", "d1,d2", "--redact", "b1"], ["--exclude", "d1,d2", "--redact", "b1"]),
+        ]
+        for expected, opts in send_cases:
+            with self.subTest(send_opts=opts):
+                self.assertEqual(expected, params.fix_send_opts(opts))
 
     def test_xprint(self):
-        log = logging.getLogger()
+        log = self.root_logger
         bzfs.xprint(log, "foo")
         bzfs.xprint(log, "foo", run=True)
         bzfs.xprint(log, "foo", run=False)
@@ -209,57 +268,61 @@ class TestHelperFunctions(unittest.TestCase):
         bzfs.xprint(log, None)
 
     def test_delete_stale_ssh_socket_files(self):
-        with tempfile.TemporaryDirectory() as tmpdir:
-            new_socket_file = os.path.join(tmpdir, "s_new_socket_file")
-            Path(new_socket_file).touch()
-            stale_socket_file = os.path.join(tmpdir, "s_stale_socket_file")
-            Path(stale_socket_file).touch()
-            one_hundred_days_ago = time.time() - 100 * 24 * 60 * 60
-            os.utime(stale_socket_file, (one_hundred_days_ago, one_hundred_days_ago))
-            dir = os.path.join(tmpdir, "s_dir")
-            os.mkdir(dir)
-            non_socket_file = os.path.join(tmpdir, "f")
-            Path(non_socket_file).touch()
-
-            bzfs.delete_stale_ssh_socket_files(tmpdir, "s")
-
-            self.assertTrue(os.path.exists(new_socket_file))
-            self.assertFalse(os.path.exists(stale_socket_file))
-            self.assertTrue(os.path.exists(dir))
-            self.assertTrue(os.path.exists(non_socket_file))
+        tmpdir = os.path.join(self.tmp_dir.name, "ssh_sockets")
+        os.mkdir(tmpdir)
+        new_socket_file = os.path.join(tmpdir, "s_new_socket_file")
+        stale_socket_file = os.path.join(tmpdir, "s_stale_socket_file")
+        non_socket_file = os.path.join(tmpdir, "f")
+        one_hundred_days_ago = time.time() - 100 * 24 * 60 * 60
+        for file in [new_socket_file, stale_socket_file, non_socket_file]:
+            fd = os.open(file, os.O_WRONLY | os.O_CREAT, 0o600)
+            if file == stale_socket_file:
+                os.utime(fd, (one_hundred_days_ago, one_hundred_days_ago))
+            os.close(fd)
+        dir = os.path.join(tmpdir, "s_dir")
+        os.mkdir(dir)
+
+        bzfs.delete_stale_ssh_socket_files(tmpdir, "s")
+
+        self.assertTrue(os.path.exists(new_socket_file))
+        self.assertFalse(os.path.exists(stale_socket_file))
+        self.assertTrue(os.path.exists(dir))
+        self.assertTrue(os.path.exists(non_socket_file))
 
     def test_recv_option_property_names(self):
-        def names(lst):
-            return bzfs.Job().recv_option_property_names(lst)
-
-        self.assertSetEqual(set(), names([]))
-        self.assertSetEqual(set(), names(["name1=value1"]))
-        self.assertSetEqual(set(), names(["name1"]))
-        self.assertSetEqual({"name1"}, names(["-o", "name1=value1"]))
-        self.assertSetEqual({"name1"}, names(["-x", "name1"]))
-        self.assertSetEqual({"name1"}, names(["-o", "name1=value1", "-o", "name1=value2", "-x", "name1"]))
-        self.assertSetEqual({"name1", "name2"}, names(["-o", "name1=value1", "-o", "name2=value2"]))
-        self.assertSetEqual({"name1", "name2"}, names(["-o", "name1=value1", "-x", "name2"]))
-        self.assertSetEqual({"name1", "name2"}, names(["-v", "-o", "name1=value1", "-o", "name2=value2"]))
-        self.assertSetEqual({"name1", "name2"}, names(["-v", "-o", "name1=value1", "-o", "name2=value2", "-F"]))
-        self.assertSetEqual({"name1", "name2"}, names(["-v", "-o", "name1=value1", "-n", "-o", "name2=value2", "-F"]))
-        self.assertSetEqual({"name1"}, names(["-o", "name1"]))
-        self.assertSetEqual({""}, names(["-o", "=value1"]))
-        self.assertSetEqual({""}, names(["-o", ""]))
-        self.assertSetEqual({"=value1"}, names(["-x", "=value1"]))
-        self.assertSetEqual({""}, names(["-x", ""]))
-        with self.assertRaises(SystemExit):
-            names(["-o"])
-        with self.assertRaises(SystemExit):
-            names(["-o", "name1=value1", "-o"])
-        with self.assertRaises(SystemExit):
-            names(["-o", "name1=value1", "-x"])
-        with self.assertRaises(SystemExit):
-            names(["-o", "-o", "name1=value1"])
-        with self.assertRaises(SystemExit):
-            names(["-x", "-x", "name1=value1"])
-        with self.assertRaises(SystemExit):
-            names([" -o ", " -o ", "name1=value1"])
+        names = bzfs.Job.recv_option_property_names
+        cases = (  # (expected, recv_opts)
+            (frozenset(), ()),
+            (frozenset(), ("name1=value1",)),
+            (frozenset(), ("name1",)),
+            (frozenset({"name1"}), ("-o", "name1=value1")),
+            (frozenset({"name1"}), ("-x", "name1")),
+            (frozenset({"name1"}), ("-o", "name1=value1", "-o", "name1=value2", "-x", "name1")),
+            (frozenset({"name1", "name2"}), ("-o", "name1=value1", "-o", "name2=value2")),
+            (frozenset({"name1", "name2"}), ("-o", "name1=value1", "-x", "name2")),
+            (frozenset({"name1", "name2"}), ("-v", "-o", "name1=value1", "-o", "name2=value2")),
+            (frozenset({"name1", "name2"}), ("-v", "-o", "name1=value1", "-o", "name2=value2", "-F")),
+            (frozenset({"name1", "name2"}), ("-v", "-o", "name1=value1", "-n", "-o", "name2=value2", "-F")),
+            (frozenset({"name1"}), ("-o", "name1")),
+            (frozenset({""}), ("-o", "=value1")),
+            (frozenset({""}), ("-o", "")),
+            (frozenset({"=value1"}), ("-x", "=value1")),
+            (frozenset({""}), ("-x", "")),
+        )
+        for expected, recv_opts in cases:
+            self.assertEqual(expected, names(list(recv_opts)))
+
+        invalid_cases = (
+            ("-o",),
+            ("-o", "name1=value1", "-o"),
+            ("-o", "name1=value1", "-x"),
+            ("-o", "-o", "name1=value1"),
+            ("-x", "-x", "name1=value1"),
+            (" -o ", " -o ", "name1=value1"),
+        )
+        for recv_opts in invalid_cases:
+            with self.assertRaises(SystemExit):
+                names(list(recv_opts))
 
     def recv_option_property_names_old(self):
         def names(lst):
@@ -298,14 +361,14 @@ class TestHelperFunctions(unittest.TestCase):
             self.assertEqual(0, len(files_todo))
 
         prefix = "test_get_logger:"
-        args = bzfs.argument_parser().parse_args(args=["src", "dst"])
-        root_logger = logging.getLogger()
+        args = self.parser.parse_args(args=["src", "dst"])
+        root_logger = self.root_logger
         log_params = None
         log = bzfs.get_logger(log_params, args, root_logger)
         self.assertTrue(log is root_logger)
         log.info(prefix + "aaa1")
 
-        args = bzfs.argument_parser().parse_args(args=["src", "dst"])
+        args = self.parser.parse_args(args=["src", "dst"])
         log_params = bzfs.LogParams(args)
         log = bzfs.get_logger(log_params, args)
         log.log(bzfs.log_stderr, "%s", prefix + "bbbe1")
@@ -318,14 +381,14 @@ class TestHelperFunctions(unittest.TestCase):
         log.trace("%s", prefix + "bbb5")
         log.setLevel(bzfs.log_trace)
         log.trace("%s", prefix + "bbb6")
-        files = {os.path.abspath(log_params.log_file)}
+        files = {log_params.abs_log_file}
         check(log, files)
 
-        args = bzfs.argument_parser().parse_args(args=["src", "dst", "-v"])
+        args = self.parser.parse_args(args=["src", "dst", "-v"])
         log_params = bzfs.LogParams(args)
         log = bzfs.get_logger(log_params, args)
         self.assertIsNotNone(log)
-        files.add(os.path.abspath(log_params.log_file))
+        files.add(log_params.abs_log_file)
         check(log, files)
 
         log.addFilter(lambda record: True)  # dummy
@@ -333,18 +396,18 @@ class TestHelperFunctions(unittest.TestCase):
         files.clear()
         check(log, files)
 
-        args = bzfs.argument_parser().parse_args(args=["src", "dst", "-v", "-v"])
+        args = self.parser.parse_args(args=["src", "dst", "-v", "-v"])
         log_params = bzfs.LogParams(args)
         log = bzfs.get_logger(log_params, args)
         self.assertIsNotNone(log)
-        files.add(os.path.abspath(log_params.log_file))
+        files.add(log_params.abs_log_file)
         check(log, files)
 
-        args = bzfs.argument_parser().parse_args(args=["src", "dst", "--quiet"])
+        args = self.parser.parse_args(args=["src", "dst", "--quiet"])
         log_params = bzfs.LogParams(args)
         log = bzfs.get_logger(log_params, args)
         self.assertIsNotNone(log)
-        files.add(os.path.abspath(log_params.log_file))
+        files.add(log_params.abs_log_file)
         check(log, files)
 
         bzfs.reset_logger()
@@ -363,8 +426,8 @@ class TestHelperFunctions(unittest.TestCase):
             self.assertIsNotNone(bzfs.validate_log_config_variable(var))
 
     def test_unlink_missing_ok(self):
-        tmp_file_fd, tmp_file = tempfile.mkstemp(prefix="test_bzfs.tmpfile_")
-        os.close(tmp_file_fd)
+        tmp_file = os.path.join(self.tmp_dir.name, "unlink_missing_ok")
+        os.close(os.open(tmp_file, os.O_WRONLY | os.O_CREAT, 0o600))
         self.assertTrue(os.path.exists(tmp_file))
         bzfs.unlink_missing_ok(tmp_file)
         self.assertFalse(os.path.exists(tmp_file))
@@ -373,6 +436,107 @@ class TestHelperFunctions(unittest.TestCase):
 
 
 #############################################################################
+# Input format is [[user@]host:]dataset
+# test columns indicate values for: input | user | host | dataset | userhost | validationError
+dataset_locator_cases = (
+    (
+        "user@host.example.com:tank1/foo/bar",
+        "user",
+        "host.example.com",
+        "tank1/foo/bar",
+        "user@host.example.com",
+        False,
+    ),
+    ("joe@192.168.1.1:tank1/foo/bar:baz:boo", "joe", "192.168.1.1", "tank1/foo/bar:baz:boo", "joe@192.168.1.1", False),
+    ("tank1/foo/bar", "", "", "tank1/foo/bar", "", False),
+    ("-:tank1/foo/bar:baz:boo", "", "", "tank1/foo/bar:baz:boo", "", False),
+    ("host.example.com:tank1/foo/bar", "", "host.example.com", "tank1/foo/bar", "host.example.com", False),
+    ("root@host.example.com:tank1", "root", "host.example.com", "tank1", "root@host.example.com", False),
+    ("192.168.1.1:tank1/foo/bar", "", "192.168.1.1", "tank1/foo/bar", "192.168.1.1", False),
+    ("user@192.168.1.1:tank1/foo/bar", "user", "192.168.1.1", "tank1/foo/bar", "user@192.168.1.1", False),
+    (
+        "user@host_2024-01-02:a3:04:56:tank1/foo/bar",
+        "user",
+        "host_2024-01-02",
+        "a3:04:56:tank1/foo/bar",
+        "user@host_2024-01-02",
+        False,
+    ),
+    (
+        "user@host_2024-01-02:a3:04:56:tank1:/foo:/:bar",
+        "user",
+        "host_2024-01-02",
+        "a3:04:56:tank1:/foo:/:bar",
+        "user@host_2024-01-02",
+        False,
+    ),
+    (
+        "user@host_2024-01-02:03:04:56:tank1/foo/bar",
+        "user",
+        "host_2024-01-02",
+        "03:04:56:tank1/foo/bar",
+        "user@host_2024-01-02",
+        True,
+    ),
+    ("user@localhost:tank1/foo/bar", "user", "localhost", "tank1/foo/bar", "user@localhost", False),
+    ("host.local:tank1/foo/bar", "", "host.local", "tank1/foo/bar", "host.local", False),
+    ("host.local:tank1/foo/bar", "", "host.local", "tank1/foo/bar", "host.local", False),
+    ("user@host:", "user", "host", "", "user@host", True),
+    ("@host:tank1/foo/bar", "", "host", "tank1/foo/bar", "host", False),
+    ("@host:tank1/foo/bar", "", "host", "tank1/foo/bar", "host", False),
+    ("@host:", "", "host", "", "host", True),
+    ("user@:tank1/foo/bar", "", "user@", "tank1/foo/bar", "user@", True),
+    ("user@:", "", "user@", "", "user@", True),
+    ("@", "", "", "@", "", True),
+    ("@foo", "", "", "@foo", "", True),
+    ("@@", "", "", "@@", "", True),
+    (":::tank1:foo:bar:", "", "", ":::tank1:foo:bar:", "", True),
+    (":::tank1/bar", "", "", ":::tank1/bar", "", True),
+    (":::", "", "", ":::", "", True),
+    ("::tank1/bar", "", "", "::tank1/bar", "", True),
+    ("::", "", "", "::", "", True),
+    (":tank1/bar", "", "", ":tank1/bar", "", True),
+    (":", "", "", ":", "", True),
+    ("", "", "", "", "", True),
+    ("/", "", "", "/", "", True),
+    ("tank//foo", "", "", "tank//foo", "", True),
+    ("/tank1", "", "", "/tank1", "", True),
+    ("tank1/", "", "", "tank1/", "", True),
+    (".", "", "", ".", "", True),
+    ("..", "", "", "..", "", True),
+    ("./tank", "", "", "./tank", "", True),
+    ("../tank", "", "", "../tank", "", True),
+    ("tank/..", "", "", "tank/..", "", True),
+    ("tank/.", "", "", "tank/.", "", True),
+    ("tank/fo`o", "", "", "tank/fo`o", "", True),
+    ("tank/fo$o", "", "", "tank/fo$o", "", True),
+    ("tank/fo\\o", "", "", "tank/fo\\o", "", True),
+    ("u`ser@localhost:tank1/foo/bar", "u`ser", "localhost", "tank1/foo/bar", "u`ser@localhost", True),
+    ("u'ser@localhost:tank1/foo/bar", "u'ser", "localhost", "tank1/foo/bar", "u'ser@localhost", True),
+    ('u"ser@localhost:tank1/foo/bar', 'u"ser', "localhost", "tank1/foo/bar", 'u"ser@localhost', True),
+    ("user@l`ocalhost:tank1/foo/bar", "user", "l`ocalhost", "tank1/foo/bar", "user@l`ocalhost", True),
+    ("user@l'ocalhost:tank1/foo/bar", "user", "l'ocalhost", "tank1/foo/bar", "user@l'ocalhost", True),
+    ('user@l"ocalhost:tank1/foo/bar', "user", 'l"ocalhost', "tank1/foo/bar", 'user@l"ocalhost', True),
+    ("user@host.ex.com:tank1/foo@bar", "user", "host.ex.com", "tank1/foo@bar", "user@host.ex.com", True),
+    ("user@host.ex.com:tank1/foo#bar", "user", "host.ex.com", "tank1/foo#bar", "user@host.ex.com", True),
+    (
+        "whitespace user@host.ex.com:tank1/foo/bar",
+        "whitespace user",
+        "host.ex.com",
+        "tank1/foo/bar",
+        "whitespace user@host.ex.com",
+        True,
+    ),
+    ("user@whitespace\thost:tank1/foo/bar", "user", "whitespace\thost", "tank1/foo/bar", "user@whitespace\thost", True),
+    ("user@host:tank1/foo/whitespace\tbar", "user", "host", "tank1/foo/whitespace\tbar", "user@host", True),
+    ("user@host:tank1/foo/whitespace\nbar", "user", "host", "tank1/foo/whitespace\nbar", "user@host", True),
+    ("user@host:tank1/foo/whitespace\rbar", "user", "host", "tank1/foo/whitespace\rbar", "user@host", True),
+    ("user@host:tank1/foo/space bar", "user", "host", "tank1/foo/space bar", "user@host", False),
+    ("user@||1:tank1/foo/space bar", "user", "::1", "tank1/foo/space bar", "user@::1", False),
+    ("user@::1:tank1/foo/space bar", "", "user@", ":1:tank1/foo/space bar", "user@", True),
+)
+
+
 class TestParseDatasetLocator(unittest.TestCase):
     def run_test(self, input, expected_user, expected_host, expected_dataset, expected_user_host, expected_error):
         expected_status = 0 if not expected_error else 3
@@ -407,196 +571,47 @@ class TestParseDatasetLocator(unittest.TestCase):
             self.fail()
 
     def test_basic(self):
-        # Input format is [[user@]host:]dataset
-        # test columns indicate values for: input | user | host | dataset | userhost | validationError
-        self.run_test(
-            "user@host.example.com:tank1/foo/bar",
-            "user",
-            "host.example.com",
-            "tank1/foo/bar",
-            "user@host.example.com",
-            False,
-        )
-        self.run_test(
-            "joe@192.168.1.1:tank1/foo/bar:baz:boo",
-            "joe",
-            "192.168.1.1",
-            "tank1/foo/bar:baz:boo",
-            "joe@192.168.1.1",
-            False,
-        )
-        self.run_test("tank1/foo/bar", "", "", "tank1/foo/bar", "", False)
-        self.run_test("-:tank1/foo/bar:baz:boo", "", "", "tank1/foo/bar:baz:boo", "", False)
-        self.run_test(
-            "host.example.com:tank1/foo/bar", "", "host.example.com", "tank1/foo/bar", "host.example.com", False
-        )
-        self.run_test(
-            "root@host.example.com:tank1", "root", "host.example.com", "tank1", "root@host.example.com", False
-        )
-        self.run_test("192.168.1.1:tank1/foo/bar", "", "192.168.1.1", "tank1/foo/bar", "192.168.1.1", False)
-        self.run_test(
-            "user@192.168.1.1:tank1/foo/bar", "user", "192.168.1.1", "tank1/foo/bar", "user@192.168.1.1", False
-        )
-        self.run_test(
-            "user@host_2024-01-02:a3:04:56:tank1/foo/bar",
-            "user",
-            "host_2024-01-02",
-            "a3:04:56:tank1/foo/bar",
-            "user@host_2024-01-02",
-            False,
-        )
-        self.run_test(
-            "user@host_2024-01-02:a3:04:56:tank1:/foo:/:bar",
-            "user",
-            "host_2024-01-02",
-            "a3:04:56:tank1:/foo:/:bar",
-            "user@host_2024-01-02",
-            False,
-        )
-        self.run_test(
-            "user@host_2024-01-02:03:04:56:tank1/foo/bar",
-            "user",
-            "host_2024-01-02",
-            "03:04:56:tank1/foo/bar",
-            "user@host_2024-01-02",
-            True,
-        )
-        self.run_test("user@localhost:tank1/foo/bar", "user", "localhost", "tank1/foo/bar", "user@localhost", False)
-        self.run_test("host.local:tank1/foo/bar", "", "host.local", "tank1/foo/bar", "host.local", False)
-        self.run_test("host.local:tank1/foo/bar", "", "host.local", "tank1/foo/bar", "host.local", False)
-        self.run_test("user@host:", "user", "host", "", "user@host", True)
-        self.run_test("@host:tank1/foo/bar", "", "host", "tank1/foo/bar", "host", False)
-        self.run_test("@host:tank1/foo/bar", "", "host", "tank1/foo/bar", "host", False)
-        self.run_test("@host:", "", "host", "", "host", True)
-        self.run_test("user@:tank1/foo/bar", "", "user@", "tank1/foo/bar", "user@", True)
-        self.run_test("user@:", "", "user@", "", "user@", True)
-        self.run_test("@", "", "", "@", "", True)
-        self.run_test("@foo", "", "", "@foo", "", True)
-        self.run_test("@@", "", "", "@@", "", True)
-        self.run_test(":::tank1:foo:bar:", "", "", ":::tank1:foo:bar:", "", True)
-        self.run_test(":::tank1/bar", "", "", ":::tank1/bar", "", True)
-        self.run_test(":::", "", "", ":::", "", True)
-        self.run_test("::tank1/bar", "", "", "::tank1/bar", "", True)
-        self.run_test("::", "", "", "::", "", True)
-        self.run_test(":tank1/bar", "", "", ":tank1/bar", "", True)
-        self.run_test(":", "", "", ":", "", True)
-        self.run_test("", "", "", "", "", True)
-        self.run_test("/", "", "", "/", "", True)
-        self.run_test("tank//foo", "", "", "tank//foo", "", True)
-        self.run_test("/tank1", "", "", "/tank1", "", True)
-        self.run_test("tank1/", "", "", "tank1/", "", True)
-        self.run_test(".", "", "", ".", "", True)
-        self.run_test("..", "", "", "..", "", True)
-        self.run_test("./tank", "", "", "./tank", "", True)
-        self.run_test("../tank", "", "", "../tank", "", True)
-        self.run_test("tank/..", "", "", "tank/..", "", True)
-        self.run_test("tank/.", "", "", "tank/.", "", True)
-        self.run_test("tank/fo`o", "", "", "tank/fo`o", "", True)
-        self.run_test("tank/fo$o", "", "", "tank/fo$o", "", True)
-        self.run_test("tank/fo\\o", "", "", "tank/fo\\o", "", True)
-        self.run_test("u`ser@localhost:tank1/foo/bar", "u`ser", "localhost", "tank1/foo/bar", "u`ser@localhost", True)
-        self.run_test("u'ser@localhost:tank1/foo/bar", "u'ser", "localhost", "tank1/foo/bar", "u'ser@localhost", True)
-        self.run_test('u"ser@localhost:tank1/foo/bar', 'u"ser', "localhost", "tank1/foo/bar", 'u"ser@localhost', True)
-        self.run_test("user@l`ocalhost:tank1/foo/bar", "user", "l`ocalhost", "tank1/foo/bar", "user@l`ocalhost", True)
-        self.run_test("user@l'ocalhost:tank1/foo/bar", "user", "l'ocalhost", "tank1/foo/bar", "user@l'ocalhost", True)
-        self.run_test('user@l"ocalhost:tank1/foo/bar', "user", 'l"ocalhost', "tank1/foo/bar", 'user@l"ocalhost', True)
-        self.run_test(
-            "user@host.ex.com:tank1/foo@bar", "user", "host.ex.com", "tank1/foo@bar", "user@host.ex.com", True
-        )
-        self.run_test(
-            "user@host.ex.com:tank1/foo#bar", "user", "host.ex.com", "tank1/foo#bar", "user@host.ex.com", True
-        )
-        self.run_test(
-            "whitespace user@host.ex.com:tank1/foo/bar",
-            "whitespace user",
-            "host.ex.com",
-            "tank1/foo/bar",
-            "whitespace user@host.ex.com",
-            True,
-        )
-        self.run_test(
-            "user@whitespace\thost:tank1/foo/bar",
-            "user",
-            "whitespace\thost",
-            "tank1/foo/bar",
-            "user@whitespace\thost",
-            True,
-        )
-        self.run_test(
-            "user@host:tank1/foo/whitespace\tbar", "user", "host", "tank1/foo/whitespace\tbar", "user@host", True
-        )
-        self.run_test(
-            "user@host:tank1/foo/whitespace\nbar", "user", "host", "tank1/foo/whitespace\nbar", "user@host", True
-        )
-        self.run_test(
-            "user@host:tank1/foo/whitespace\rbar", "user", "host", "tank1/foo/whitespace\rbar", "user@host", True
-        )
-        self.run_test("user@host:tank1/foo/space bar", "user", "host", "tank1/foo/space bar", "user@host", False)
-        self.run_test("user@||1:tank1/foo/space bar", "user", "::1", "tank1/foo/space bar", "user@::1", False)
-        self.run_test("user@::1:tank1/foo/space bar", "", "user@", ":1:tank1/foo/space bar", "user@", True)
+        for case in dataset_locator_cases:
+            self.run_test(*case)
 
 
 #############################################################################
 class TestReplaceCapturingGroups(unittest.TestCase):
-    def replace_capturing_group(self, regex):
-        return bzfs.replace_capturing_groups_with_non_capturing_groups(regex)
-
-    def test_basic_case(self):
-        self.assertEqual(self.replace_capturing_group("(abc)"), "(?:abc)")
-
-    def test_nested_groups(self):
-        self.assertEqual(self.replace_capturing_group("(a(bc)d)"), "(?:a(?:bc)d)")
-
-    def test_preceding_backslash(self):
-        self.assertEqual(self.replace_capturing_group("\\(abc)"), "\\(abc)")
 
-    def test_group_starting_with_question_mark(self):
-        self.assertEqual(self.replace_capturing_group("(?abc)"), "(?abc)")
-
-    def test_multiple_groups(self):
-        self.assertEqual(self.replace_capturing_group("(abc)(def)"), "(?:abc)(?:def)")
-
-    def test_mixed_cases(self):
-        self.assertEqual(self.replace_capturing_group("a(bc\\(de)f(gh)?i"), "a(?:bc\\(de)f(?:gh)?i")
-
-    def test_empty_group(self):
-        self.assertEqual(self.replace_capturing_group("()"), "(?:)")
-
-    def test_group_with_named_group(self):
-        self.assertEqual(self.replace_capturing_group("(?P<name>abc)"), "(?P<name>abc)")
-
-    def test_group_with_non_capturing_group(self):
-        self.assertEqual(self.replace_capturing_group("(a(?:bc)d)"), "(?:a(?:bc)d)")
-
-    def test_group_with_lookahead(self):
-        self.assertEqual(self.replace_capturing_group("(abc)(?=def)"), "(?:abc)(?=def)")
-
-    def test_group_with_lookbehind(self):
-        self.assertEqual(self.replace_capturing_group("(?<=abc)(def)"), "(?<=abc)(?:def)")
-
-    def test_escaped_characters(self):
-        pattern = re.escape("(abc)")
-        self.assertEqual(self.replace_capturing_group(pattern), pattern)
-
-    def test_complex_pattern_with_escape(self):
-        complex_pattern = re.escape("(a[b]c{d}e|f.g)")
-        self.assertEqual(self.replace_capturing_group(complex_pattern), complex_pattern)
-
-    def test_complex_pattern(self):
-        complex_pattern = "(a[b]c{d}e|f.g)(h(i|j)k)?(\\(l\\))"
-        expected_result = "(?:a[b]c{d}e|f.g)(?:h(?:i|j)k)?(?:\\(l\\))"
-        self.assertEqual(self.replace_capturing_group(complex_pattern), expected_result)
+    def test_replace_capturing_groups(self):
+        cases = [  # (regex, expected)
+            ("(abc)", "(?:abc)"),  # basic case
+            ("(a(bc)d)", "(?:a(?:bc)d)"),  # nested groups
+            ("\\(abc)", "\\(abc)"),  # preceding backslash
+            ("(?abc)", "(?abc)"),  # group starting with question mark
+            ("(abc)(def)", "(?:abc)(?:def)"),  # multiple groups
+            ("a(bc\\(de)f(gh)?i", "a(?:bc\\(de)f(?:gh)?i"),  # mixed cases
+            ("a(", "a("),  # trailing brace
+            ("()", "(?:)"),  # empty group
+            ("(?P<name>abc)", "(?P<name>abc)"),  # named group
+            ("(a(?:bc)d)", "(?:a(?:bc)d)"),  # non-capturing group
+            ("(abc)(?=def)", "(?:abc)(?=def)"),  # lookahead
+            ("(?<=abc)(def)", "(?<=abc)(?:def)"),  # lookbehind
+            (re.escape("(abc)"), re.escape("(abc)")),  # escaped characters
+            (re.escape("(a[b]c{d}e|f.g)"), re.escape("(a[b]c{d}e|f.g)")),  # complex pattern with escape
+            ("(a[b]c{d}e|f.g)(h(i|j)k)?(\\(l\\))", "(?:a[b]c{d}e|f.g)(?:h(?:i|j)k)?(?:\\(l\\))"),  # complex pattern
+        ]
+        for regex, expected in cases:
+            with self.subTest(regex=regex):
+                self.assertEqual(expected, bzfs.replace_capturing_groups_with_non_capturing_groups(regex))
 
 
 #############################################################################
 class TestFindMatch(unittest.TestCase):
 
     def test_basic(self):
-        condition = lambda arg: arg.startswith("-")
+        condition = operator.methodcaller("startswith", "-")  # avoids the per-call overhead of a Python lambda
 
-        lst = ["a", "b", "-c", "d"]
+        lst = ("a", "b", "-c", "d")
         self.assert_find_match(2, lst, condition)
 
+        self.assert_find_match(2, lst, condition, -5)  # clamped to the start of lst, like lst[-5:]
+        self.assert_find_match(2, lst, condition, -4)
         self.assert_find_match(2, lst, condition, -3)
         self.assert_find_match(2, lst, condition, -2)
         self.assert_find_match(-1, lst, condition, -1)
@@ -640,7 +655,7 @@ class TestFindMatch(unittest.TestCase):
             find_match(lst, condition, start=0, end=2, raises="")
         self.assertEqual("", str(e.exception))
 
-        lst = ["-c"]
+        lst = ("-c",)
         self.assert_find_match(0, lst, condition)
         self.assert_find_match(0, lst, condition, -1)
         self.assert_find_match(0, lst, condition, 0)
@@ -654,7 +669,7 @@ class TestFindMatch(unittest.TestCase):
         self.assert_find_match(-1, lst, condition, start=2, end=-2)
         self.assert_find_match(-1, lst, condition, start=3, end=-1)
 
-        lst = []
+        lst = ()
         self.assert_find_match(-1, lst, condition)
         self.assert_find_match(-1, lst, condition, -1)
         self.assert_find_match(-1, lst, condition, 0)
@@ -668,7 +683,7 @@ class TestFindMatch(unittest.TestCase):
         self.assert_find_match(-1, lst, condition, start=2, end=-2)
         self.assert_find_match(-1, lst, condition, start=3, end=-1)
 
-        lst = ["a", "b", "-c", "-d"]
+        lst = ("a", "b", "-c", "-d")
         self.assertEqual(2, find_match(lst, condition, start=None, end=None, reverse=False))
         self.assertEqual(3, find_match(lst, condition, start=None, end=None, reverse=True))
         self.assertEqual(2, find_match(lst, condition, start=2, end=None, reverse=False))
@@ -685,7 +700,7 @@ class TestFindMatch(unittest.TestCase):
         self.assertEqual(2, find_match(lst, condition, start=-3, end=None, reverse=False))
         self.assertEqual(3, find_match(lst, condition, start=-3, end=None, reverse=True))
 
-        lst = ["-a", "-b", "c", "d"]
+        lst = ("-a", "-b", "c", "d")
         self.assertEqual(0, find_match(lst, condition, end=-1, reverse=False))
         self.assertEqual(1, find_match(lst, condition, end=-1, reverse=True))
         self.assertEqual(0, find_match(lst, condition, end=-2, reverse=False))
@@ -695,7 +710,7 @@ class TestFindMatch(unittest.TestCase):
         self.assertEqual(-1, find_match(lst, condition, end=-4, reverse=False))
         self.assertEqual(-1, find_match(lst, condition, end=-4, reverse=True))
 
-        lst = ["a", "-b", "-c", "d"]
+        lst = ("a", "-b", "-c", "d")
         self.assertEqual(1, find_match(lst, condition, start=1, end=-1, reverse=False))
         self.assertEqual(2, find_match(lst, condition, start=1, end=-1, reverse=True))
         self.assertEqual(1, find_match(lst, condition, start=1, end=-2, reverse=False))
@@ -709,45 +724,71 @@ class TestFindMatch(unittest.TestCase):
 #############################################################################
 class TestArgumentParser(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        cls.parser = bzfs.argument_parser()
+
+    def assert_exit(self, expected_code, argv):
+        with self.assertRaises(SystemExit) as e:
+            self.parser.parse_args(argv)
+        self.assertEqual(expected_code, e.exception.code)
+
     def test_help(self):
         if is_solaris_zfs():
             self.skipTest("FIXME: BlockingIOError: [Errno 11] write could not complete without blocking")
-        parser = bzfs.argument_parser()
-        with self.assertRaises(SystemExit) as e:
-            parser.parse_args(["--help"])
-        self.assertEqual(0, e.exception.code)
+        self.assert_exit(0, ["--help"])
 
     def test_version(self):
-        parser = bzfs.argument_parser()
-        with self.assertRaises(SystemExit) as e:
-            parser.parse_args(["--version"])
-        self.assertEqual(0, e.exception.code)
+        self.assert_exit(0, ["--version"])
 
     def test_missing_datasets(self):
-        parser = bzfs.argument_parser()
-        with self.assertRaises(SystemExit) as e:
-            parser.parse_args(["--retries=1"])
-        self.assertEqual(2, e.exception.code)
+        self.assert_exit(2, ["--retries=1"])
 
     def test_missing_dst_dataset(self):
-        parser = bzfs.argument_parser()
-        with self.assertRaises(SystemExit) as e:
-            parser.parse_args(["src_dataset"])  # Each SRC_DATASET must have a corresponding DST_DATASET
-        self.assertEqual(2, e.exception.code)
+        self.assert_exit(2, ["src_dataset"])  # Each SRC_DATASET must have a corresponding DST_DATASET
 
     def test_program_must_not_be_empty_string(self):
+        self.assert_exit(2, ["src_dataset", "src_dataset", "--zfs-program="])
+
+    def test_cached_parser_does_not_leak_values_between_parses(self):
         parser = bzfs.argument_parser()
-        with self.assertRaises(SystemExit) as e:
-            parser.parse_args(["src_dataset", "src_dataset", "--zfs-program="])
-        self.assertEqual(2, e.exception.code)
+        self.assertIs(parser, bzfs.argument_parser())
+        args = parser.parse_args(["src", "dst", "--include-snapshot-regex=foo", "--log-config-var=name:value"])
+        self.assertEqual(["foo"], args.include_snapshot_regex)
+        self.assertEqual(["name:value"], args.log_config_var)
+        args = parser.parse_args(["src", "dst"])
+        self.assertEqual([], args.include_snapshot_regex)
+        self.assertEqual([], args.log_config_var)
 
 
 #############################################################################
-class TestDatasetPairsAction(unittest.TestCase):
+class InputFileTestCase(unittest.TestCase):
+    """Base class for tests that read "+file" inputs from a temporary directory shared by all tests of the class."""
 
-    def setUp(self):
-        self.parser = argparse.ArgumentParser()
-        self.parser.add_argument("--input", nargs="+", action=bzfs.DatasetPairsAction)
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory(prefix="test_bzfs.")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def input_file(self, content: str) -> str:
+        """Writes the given content to a new file and returns the file name with a '+' prefix."""
+        fd, file = tempfile.mkstemp(dir=self.tmp_dir.name)
+        os.write(fd, content.encode("utf-8"))
+        os.close(fd)
+        return "+" + file
+
+
+#############################################################################
+class TestDatasetPairsAction(InputFileTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.parser = argparse.ArgumentParser()
+        cls.parser.add_argument("--input", nargs="+", action=bzfs.DatasetPairsAction)
 
     def test_direct_value(self):
         args = self.parser.parse_args(["--input", "src1", "dst1"])
@@ -758,47 +799,46 @@ class TestDatasetPairsAction(unittest.TestCase):
             self.parser.parse_args(["--input", "src1"])
 
     def test_file_input(self):
-        with patch("builtins.open", mock_open(read_data="src1\tdst1\nsrc2\tdst2\n")):
-            args = self.parser.parse_args(["--input", "+testfile"])
-            self.assertEqual(args.input, [("src1", "dst1"), ("src2", "dst2")])
+        testfile = self.input_file("src1\tdst1\nsrc2\tdst2\n")
+        args = self.parser.parse_args(["--input", testfile])
+        self.assertEqual(args.input, [("src1", "dst1"), ("src2", "dst2")])
 
     def test_file_input_without_trailing_newline(self):
-        with patch("builtins.open", mock_open(read_data="src1\tdst1\nsrc2\tdst2")):
-            args = self.parser.parse_args(["--input", "+testfile"])
-            self.assertEqual(args.input, [("src1", "dst1"), ("src2", "dst2")])
+        testfile = self.input_file("src1\tdst1\nsrc2\tdst2")
+        args = self.parser.parse_args(["--input", testfile])
+        self.assertEqual(args.input, [("src1", "dst1"), ("src2", "dst2")])
 
     def test_mixed_input(self):
-        with patch("builtins.open", mock_open(read_data="src1\tdst1\nsrc2\tdst2\n")):
-            args = self.parser.parse_args(["--input", "src0", "dst0", "+testfile"])
-            self.assertEqual(args.input, [("src0", "dst0"), ("src1", "dst1"), ("src2", "dst2")])
+        testfile = self.input_file("src1\tdst1\nsrc2\tdst2\n")
+        args = self.parser.parse_args(["--input", "src0", "dst0", testfile])
+        self.assertEqual(args.input, [("src0", "dst0"), ("src1", "dst1"), ("src2", "dst2")])
 
     def test_file_skip_comments_and_empty_lines(self):
-        with patch("builtins.open", mock_open(read_data="\n\n#comment\nsrc1\tdst1\nsrc2\tdst2\n")):
-            args = self.parser.parse_args(["--input", "+testfile"])
-            self.assertEqual(args.input, [("src1", "dst1"), ("src2", "dst2")])
+        testfile = self.input_file("\n\n#comment\nsrc1\tdst1\nsrc2\tdst2\n")
+        args = self.parser.parse_args(["--input", testfile])
+        self.assertEqual(args.input, [("src1", "dst1"), ("src2", "dst2")])
 
     def test_file_skip_stripped_empty_lines(self):
-        with patch("builtins.open", mock_open(read_data=" \t \nsrc1\tdst1")):
-            args = self.parser.parse_args(["--input", "+testfile"])
-            self.assertEqual(args.input, [("src1", "dst1")])
+        testfile = self.input_file(" \t \nsrc1\tdst1")
+        args = self.parser.parse_args(["--input", testfile])
+        self.assertEqual(args.input, [("src1", "dst1")])
 
     def test_file_missing_tab(self):
-        with patch("builtins.open", mock_open(read_data="src1\nsrc2")):
-            with self.assertRaises(SystemExit):
-                self.parser.parse_args(["--input", "+testfile"])
+        testfile = self.input_file("src1\nsrc2")
+        with self.assertRaises(SystemExit):
+            self.parser.parse_args(["--input", testfile])
 
     def test_file_whitespace_only(self):
-        with patch("builtins.open", mock_open(read_data=" \tdst1")):
-            with self.assertRaises(SystemExit):
-                self.parser.parse_args(["--input", "+testfile"])
+        testfile = self.input_file(" \tdst1")
+        with self.assertRaises(SystemExit):
+            self.parser.parse_args(["--input", testfile])
 
-        with patch("builtins.open", mock_open(read_data="src1\t ")):
-            with self.assertRaises(SystemExit):
-                self.parser.parse_args(["--input", "+testfile"])
+        testfile = self.input_file("src1\t ")
+        with self.assertRaises(SystemExit):
+            self.parser.parse_args(["--input", testfile])
 
-        with patch("builtins.open", side_effect=FileNotFoundError):
-            with self.assertRaises(SystemExit):
-                self.parser.parse_args(["--input", "+nonexistentfile"])
+        with self.assertRaises(SystemExit):
+            self.parser.parse_args(["--input", "+" + os.path.join(self.tmp_dir.name, "nonexistentfile")])
 
     def test_option_not_specified(self):
         args = self.parser.parse_args([])
@@ -806,35 +846,36 @@ class TestDatasetPairsAction(unittest.TestCase):
 
 
 #############################################################################
-class TestFileOrLiteralAction(unittest.TestCase):
+class TestFileOrLiteralAction(InputFileTestCase):
 
-    def setUp(self):
-        self.parser = argparse.ArgumentParser()
-        self.parser.add_argument("--input", nargs="+", action=bzfs.FileOrLiteralAction)
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.parser = argparse.ArgumentParser()
+        cls.parser.add_argument("--input", nargs="+", action=bzfs.FileOrLiteralAction)
 
     def test_direct_value(self):
         args = self.parser.parse_args(["--input", "literalvalue"])
         self.assertEqual(args.input, ["literalvalue"])
 
     def test_file_input(self):
-        with patch("builtins.open", mock_open(read_data="line 1\nline 2  \n")):
-            args = self.parser.parse_args(["--input", "+testfile"])
-            self.assertEqual(args.input, ["line 1", "line 2  "])
+        testfile = self.input_file("line 1\nline 2  \n")
+        args = self.parser.parse_args(["--input", testfile])
+        self.assertEqual(args.input, ["line 1", "line 2  "])
 
     def test_mixed_input(self):
-        with patch("builtins.open", mock_open(read_data="line 1\nline 2")):
-            args = self.parser.parse_args(["--input", "literalvalue", "+testfile"])
-            self.assertEqual(args.input, ["literalvalue", "line 1", "line 2"])
+        testfile = self.input_file("line 1\nline 2")
+        args = self.parser.parse_args(["--input", "literalvalue", testfile])
+        self.assertEqual(args.input, ["literalvalue", "line 1", "line 2"])
 
     def test_skip_comments_and_empty_lines(self):
-        with patch("builtins.open", mock_open(read_data="\n\n#comment\nline 1\n\n\nline 2\n")):
-            args = self.parser.parse_args(["--input", "+testfile"])
-            self.assertEqual(args.input, ["line 1", "line 2"])
+        testfile = self.input_file("\n\n#comment\nline 1\n\n\nline 2\n")
+        args = self.parser.parse_args(["--input", testfile])
+        self.assertEqual(args.input, ["line 1", "line 2"])
 
     def test_file_not_found(self):
-        with patch("builtins.open", side_effect=FileNotFoundError):
-            with self.assertRaises(SystemExit):
-                self.parser.parse_args(["--input", "+nonexistentfile"])
+        with self.assertRaises(SystemExit):
+            self.parser.parse_args(["--input", "+" + os.path.join(self.tmp_dir.name, "nonexistentfile")])
 
     def test_option_not_specified(self):
         args = self.parser.parse_args([])
@@ -977,9 +1018,10 @@ class TestTimestampAction(unittest.TestCase):
 #############################################################################
 class TestLogConfigVariablesAction(unittest.TestCase):
 
-    def setUp(self):
-        self.parser = argparse.ArgumentParser()
-        self.parser.add_argument("--log-config-var", nargs="+", action=bzfs.LogConfigVariablesAction)
+    @classmethod
+    def setUpClass(cls):
+        cls.parser = argparse.ArgumentParser()
+        cls.parser.add_argument("--log-config-var", nargs="+", action=bzfs.LogConfigVariablesAction)
 
     def test_basic(self):
         args = self.parser.parse_args(["--log-config-var", "name1:val1", "name2:val2"])
@@ -993,27 +1035,35 @@ class TestLogConfigVariablesAction(unittest.TestCase):
 #############################################################################
 class TestCheckRange(unittest.TestCase):
 
+    parsers = {}  # building an ArgumentParser is comparatively expensive, so share parsers among tests
+
+    @classmethod
+    def age_parser(cls, **kwargs) -> argparse.ArgumentParser:
+        key = tuple(sorted(kwargs.items()))
+        parser = cls.parsers.get(key)
+        if parser is None:
+            parser = argparse.ArgumentParser()
+            parser.add_argument("--age", action=bzfs.CheckRange, **kwargs)
+            cls.parsers[key] = parser
+        return parser
+
     def test_valid_range_min_max(self):
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--age", type=int, action=bzfs.CheckRange, min=0, max=100)
+        parser = self.age_parser(type=int, min=0, max=100)
         args = parser.parse_args(["--age", "50"])
         self.assertEqual(args.age, 50)
 
     def test_valid_range_inf_sup(self):
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--age", type=int, action=bzfs.CheckRange, inf=0, sup=100)
+        parser = self.age_parser(type=int, inf=0, sup=100)
         args = parser.parse_args(["--age", "50"])
         self.assertEqual(args.age, 50)
 
     def test_invalid_range_min_max(self):
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--age", type=int, action=bzfs.CheckRange, min=0, max=100)
+        parser = self.age_parser(type=int, min=0, max=100)
         with self.assertRaises(SystemExit):
             parser.parse_args(["--age", "-1"])
 
     def test_invalid_range_inf_sup(self):
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--age", type=int, action=bzfs.CheckRange, inf=0, sup=100)
+        parser = self.age_parser(type=int, inf=0, sup=100)
         with self.assertRaises(SystemExit):
             parser.parse_args(["--age", "101"])
 
@@ -1028,68 +1078,56 @@ class TestCheckRange(unittest.TestCase):
             parser.add_argument("--age", type=int, action=bzfs.CheckRange, max=0, sup=100)
 
     def test_valid_float_range_min_max(self):
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--age", type=float, action=bzfs.CheckRange, min=0.0, max=100.0)
+        parser = self.age_parser(type=float, min=0.0, max=100.0)
         args = parser.parse_args(["--age", "50.5"])
         self.assertEqual(args.age, 50.5)
 
     def test_invalid_float_range_min_max(self):
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--age", type=float, action=bzfs.CheckRange, min=0.0, max=100.0)
+        parser = self.age_parser(type=float, min=0.0, max=100.0)
         with self.assertRaises(SystemExit):
             parser.parse_args(["--age", "-0.1"])
 
     def test_valid_edge_case_min(self):
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--age", type=float, action=bzfs.CheckRange, min=0.0, max=100.0)
+        parser = self.age_parser(type=float, min=0.0, max=100.0)
         args = parser.parse_args(["--age", "0.0"])
         self.assertEqual(args.age, 0.0)
 
     def test_valid_edge_case_max(self):
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--age", type=float, action=bzfs.CheckRange, min=0.0, max=100.0)
+        parser = self.age_parser(type=float, min=0.0, max=100.0)
         args = parser.parse_args(["--age", "100.0"])
         self.assertEqual(args.age, 100.0)
 
     def test_invalid_edge_case_sup(self):
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--age", type=float, action=bzfs.CheckRange, inf=0.0, sup=100.0)
+        parser = self.age_parser(type=float, inf=0.0, sup=100.0)
         with self.assertRaises(SystemExit):
             parser.parse_args(["--age", "100.0"])
 
     def test_invalid_edge_case_inf(self):
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--age", type=float, action=bzfs.CheckRange, inf=0.0, sup=100.0)
+        parser = self.age_parser(type=float, inf=0.0, sup=100.0)
         with self.assertRaises(SystemExit):
             parser.parse_args(["--age", "0.0"])
 
     def test_no_range_constraints(self):
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--age", type=int, action=bzfs.CheckRange)
+        parser = self.age_parser(type=int)
         args = parser.parse_args(["--age", "150"])
         self.assertEqual(args.age, 150)
 
     def test_no_range_constraints_float(self):
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--age", type=float, action=bzfs.CheckRange)
+        parser = self.age_parser(type=float)
         args = parser.parse_args(["--age", "150.5"])
         self.assertEqual(args.age, 150.5)
 
     def test_very_large_value(self):
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--age", type=int, action=bzfs.CheckRange, max=10**18)
+        parser = self.age_parser(type=int, max=10**18)
         args = parser.parse_args(["--age", "999999999999999999"])
         self.assertEqual(args.age, 999999999999999999)
 
     def test_very_small_value(self):
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--age", type=int, action=bzfs.CheckRange, min=-(10**18))
+        parser = self.age_parser(type=int, min=-(10**18))
         args = parser.parse_args(["--age", "-999999999999999999"])
         self.assertEqual(args.age, -999999999999999999)
 
     def test_default_interval(self):
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--age", type=int, action=bzfs.CheckRange)
         action = bzfs.CheckRange(option_strings=["--age"], dest="age")
         self.assertEqual(action.interval(), "valid range: (-infinity, +infinity)")
 
@@ -1110,8 +1148,7 @@ class TestCheckRange(unittest.TestCase):
         self.assertEqual(action.interval(), "valid range: (-infinity, 100]")
 
     def test_call_without_range_constraints(self):
-        parser = argparse.ArgumentParser()
-        parser.add_argument("--age", type=int, action=bzfs.CheckRange)
+        parser = self.age_parser(type=int)
         args = parser.parse_args(["--age", "50"])
         self.assertEqual(args.age, 50)
 
@@ -1119,34 +1156,76 @@ class TestCheckRange(unittest.TestCase):
 #############################################################################
 class TestPythonVersionCheck(unittest.TestCase):
     """Test version check near top of program:
-    if sys.version_info < (3, 7):
+    if version_info < (3, 7):
         print(f"ERROR: {prog_name} requires Python version >= 3.7!", file=sys.stderr)
         sys.exit(die_status)
     """
 
     @patch("sys.exit")
-    @patch("sys.version_info", new=(3, 6))
     def test_version_below_3_7(self, mock_exit):
         with patch("sys.stderr"):
-            import importlib
-            from bzfs import bzfs
-
-            importlib.reload(bzfs)  # Reload module to apply version patch
+            bzfs.validate_python_version((3, 6))
             mock_exit.assert_called_with(bzfs.die_status)
 
     @patch("sys.exit")
-    @patch("sys.version_info", new=(3, 7))
     def test_version_3_7_or_higher(self, mock_exit):
-        import importlib
-        from bzfs import bzfs
-
-        importlib.reload(bzfs)  # Reload module to apply version patch
+        bzfs.validate_python_version((3, 7))
+        mock_exit.assert_not_called()
+        bzfs.validate_python_version(sys.version_info)
         mock_exit.assert_not_called()
 
 
+#############################################################################
+class TestZfsUtilLibzfsCore(unittest.TestCase):
+    """Checks the optional libzfs_core code paths of zfs_util without requiring pyzfs to be installed."""
+
+    def setUp(self):
+        for name in ["lzc_bookmark", "lzc_exists", "lzc_snapshot"]:
+            patcher = patch.object(zfs_util, name)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+        patcher = patch.object(zfs_util, "run_cmd", side_effect=AssertionError("must not shell out to the zfs CLI"))
+        self.run_cmd = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(zfs_util.set_sudo_cmd, zfs_util.sudo_cmd)
+        zfs_util.set_sudo_cmd([])
+
+    def test_take_snapshot(self):
+        self.assertEqual("pool/ds@s1", zfs_util.take_snapshot("pool/ds", "s1"))
+        self.lzc_snapshot.assert_called_once_with([b"pool/ds@s1"])
+
+    def test_create_bookmark(self):
+        self.assertEqual("pool/ds#b1", zfs_util.create_bookmark("pool/ds", "s1", "b1"))
+        self.lzc_bookmark.assert_called_once_with({b"pool/ds#b1": b"pool/ds@s1"})
+
+    def test_dataset_exists(self):
+        self.lzc_exists.return_value = False
+        self.assertFalse(zfs_util.dataset_exists("pool/ds@s1"))
+        self.lzc_exists.assert_called_once_with(b"pool/ds@s1")
+
+    def test_destroy_uses_zfs_cli(self):
+        self.run_cmd.side_effect = None
+        zfs_util.destroy("pool/ds@s1")
+        self.run_cmd.assert_called_once_with(["zfs", "destroy", "pool/ds@s1"])
+
+    def test_sudo_falls_back_to_zfs_cli(self):
+        self.run_cmd.side_effect = None
+        zfs_util.set_sudo_cmd(["sudo"])
+        zfs_util.take_snapshot("pool/ds", "s1")
+        zfs_util.create_bookmark("pool/ds", "s1", "b1")
+        self.lzc_snapshot.assert_not_called()
+        self.lzc_bookmark.assert_not_called()
+        self.run_cmd.assert_any_call(["sudo", "zfs", "snapshot", "pool/ds@s1"])
+        self.run_cmd.assert_any_call(["sudo", "zfs", "bookmark", "pool/ds@s1", "pool/ds#b1"])
+
+
 #############################################################################
 class ExcludeSnapshotRegexValidationCase(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        cls.job = bzfs.Job()  # incremental_send_steps() is stateless, so a single Job can be shared by all tests
+
     def test_basic1(self):
         input_snapshots = ["d1", "h1", "d2", "d3", "d4"]
         expected_results = ["d1", "d2", "d3", "d4"]
@@ -1171,6 +1250,8 @@ class ExcludeSnapshotRegexValidationCase(unittest.TestCase):
         input_snapshots = []
         expected_results = []
         self.validate_incremental_send_steps(input_snapshots, expected_results)
+        for force_convert_I_to_i in [False, True]:
+            self.assertListEqual([], self.incremental_send_steps1([], force_convert_I_to_i=force_convert_I_to_i))
 
     def test_validate_snapshot_series_excluding_hourlies_with_permutations(self):
         for i, testcase in enumerate(self.permute_snapshot_series()):
@@ -1193,9 +1274,13 @@ class ExcludeSnapshotRegexValidationCase(unittest.TestCase):
         testcases = []
         for L in range(0, max_length + 1):
             for N in range(0, L + 1):
-                steps = "d" * N + "h" * (L - N)
-                # compute a permutation of several 'd' and 'h' chars that represents the snapshot series
-                for permutation in sorted(set(itertools.permutations(steps, len(steps)))):
+                # compute a permutation of several 'd' and 'h' chars that represents the snapshot series;
+                # enumerating the positions of the 'd' chars directly yields each distinct permutation exactly once,
+                # in sorted order, without generating and deduplicating all L! permutations
+                for d_positions in itertools.combinations(range(L), N):
+                    permutation = ["h"] * L
+                    for position in d_positions:
+                        permutation[position] = "d"
                     snaps = defaultdict(list)
                     count = defaultdict(int)
                     for char in permutation:
@@ -1210,6 +1295,9 @@ class ExcludeSnapshotRegexValidationCase(unittest.TestCase):
     def validate_incremental_send_steps(self, input_snapshots, expected_results):
         """Computes steps to incrementally replicate the daily snapshots of the given daily and/or hourly input
         snapshots. Applies the steps and compares the resulting destination snapshots with the expected results."""
+        if len(input_snapshots) == 0:  # nothing to replicate; see test_basic5 for the steps computed in this case
+            self.assertListEqual([], expected_results)
+            return
         # src_dataset = "s@"
         src_dataset = ""
         for force_convert_I_to_i in [False, True]:
@@ -1245,7 +1333,7 @@ class ExcludeSnapshotRegexValidationCase(unittest.TestCase):
         origin_src_snapshots_with_guids = []
         guid = 1
         for snapshot in input_snapshots:
-            origin_src_snapshots_with_guids.append(f"{guid}\t{src_dataset}{snapshot}")
+            origin_src_snapshots_with_guids.append((str(guid), f"{src_dataset}{snapshot}"))
             guid += 1
         return self.incremental_send_steps2(origin_src_snapshots_with_guids, force_convert_I_to_i=force_convert_I_to_i)
 
@@ -1253,15 +1341,14 @@ class ExcludeSnapshotRegexValidationCase(unittest.TestCase):
         guids = []
         input_snapshots = []
         included_guids = set()
-        for line in origin_src_snapshots_with_guids:
-            guid, snapshot = line.split("\t", 1)
+        for guid, snapshot in origin_src_snapshots_with_guids:
             guids.append(guid)
             input_snapshots.append(snapshot)
             i = snapshot.find("@")
             snapshot = snapshot[i + 1 :]
             if snapshot[0:1] == "d":
                 included_guids.add(guid)
-        return bzfs.Job().incremental_send_steps(
+        return self.job.incremental_send_steps(
             input_snapshots, guids, included_guids=included_guids, force_convert_I_to_i=force_convert_I_to_i
         )
 
@@ -1289,31 +1376,41 @@ def find_match(
         i = find_match(lst, lambda arg: arg.startswith("-"), start=1, end=3, reverse=True)
         if i >= 0:
             ...
-        i = find_match(lst, lambda arg: arg.startswith("-"), raises=f"Tag {tag} not found in {file}")
+        i = find_match(lst, lambda arg: arg.startswith("-"), raises="No option found")
         i = find_match(lst, lambda arg: arg.startswith("-"), raises=lambda: f"Tag {tag} not found in {file}")
     """
-    offset = 0 if start is None else start if start >= 0 else len(seq) + start
-    if start is not None or end is not None:
-        seq = seq[start:end]
-    for i, item in enumerate(reversed(seq) if reverse else seq):
-        if predicate(item):
-            if reverse:
-                return len(seq) - i - 1 + offset
-            else:
-                return i + offset
+    if start is None and end is None and not reverse:  # fast path for the most common case
+        for i, item in enumerate(seq):
+            if predicate(item):
+                return i
+    else:
+        start, end, _ = slice(start, end).indices(len(seq))  # same clamping as seq[start:end], without copying seq
+        for i in range(end - 1, start - 1, -1) if reverse else range(start, end):
+            if predicate(seq[i]):
+                return i
     if raises is False or raises is None:
         return -1
-    if raises is True:
-        raise ValueError("No matching item found in sequence")
-    if callable(raises):
-        raises = raises()
-    raise ValueError(raises)
+    msg = raises() if callable(raises) else raises if isinstance(raises, str) else "No matching item found in sequence"
+    raise ValueError(msg)
 
 
-@contextmanager
 def stop_on_failure_subtest(**params):
     """Context manager to mimic UnitTest.subTest() but stop on first failure"""
-    try:
-        yield
-    except AssertionError:
-        raise AssertionError(f"SubTest failed with parameters: {params}")
+    return StopOnFailureSubtest(params)
+
+
+class StopOnFailureSubtest:
+    """Plain context manager class; cheaper per subtest than a @contextmanager generator."""
+
+    __slots__ = ("params",)
+
+    def __init__(self, params: Dict[str, Any]):
+        self.params = params
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and issubclass(exc_type, AssertionError):
+            raise AssertionError(f"SubTest failed with parameters: {self.params}") from exc_value
+        return False
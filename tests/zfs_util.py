@@ -17,7 +17,13 @@ import platform
 import re
 import subprocess
 
+try:  # optional pyzfs bindings; issue a single ioctl instead of fork+exec of the zfs CLI
+    from libzfs_core import lzc_bookmark, lzc_exists, lzc_snapshot
+except ImportError:
+    lzc_bookmark = lzc_exists = lzc_snapshot = None
+
 sudo_cmd = []
+solaris_zfs = platform.system() == "SunOS"  # cannot change at runtime, so compute it only once
 
 
 def set_sudo_cmd(sudo):
@@ -128,6 +134,9 @@ def datasets(dataset):
 
 def take_snapshot(dataset, snapshot_tag, recursive=False, props=[]):
     snapshot = dataset + "@" + snapshot_tag
+    if not recursive and not props and is_lzc_available(lzc_snapshot):
+        lzc_snapshot([snapshot.encode("utf-8")])
+        return snapshot
     cmd = sudo_cmd + ["zfs", "snapshot"]
     if recursive:
         cmd.append("-r")
@@ -138,6 +147,14 @@ def take_snapshot(dataset, snapshot_tag, recursive=False, props=[]):
     return snapshot
 
 
+def take_snapshots(dataset, snapshot_tags):
+    """Takes the given snapshots of the same dataset in the given order, one at a time. They cannot be batched into a
+    single 'zfs snapshot ds@a ds@b ...' (or lzc_snapshot) call because ZFS refuses to take multiple snapshots of the
+    same dataset in one call: libzfs fails with EXDEV "multiple snapshots of same fs not allowed", and pyzfs raises
+    DuplicateSnapshots."""
+    return [take_snapshot(dataset, snapshot_tag) for snapshot_tag in snapshot_tags]
+
+
 def snapshots(dataset):
     return zfs_list([dataset], types=["snapshot"], max_depth=1)
 
@@ -145,6 +162,9 @@ def snapshots(dataset):
 def create_bookmark(dataset, snapshot_tag, bookmark_tag):
     snapshot = dataset + "@" + snapshot_tag
     bookmark = dataset + "#" + bookmark_tag
+    if is_lzc_available(lzc_bookmark):
+        lzc_bookmark({bookmark.encode("utf-8"): snapshot.encode("utf-8")})
+        return bookmark
     run_cmd(sudo_cmd + ["zfs", "bookmark", snapshot, bookmark])
     return bookmark
 
@@ -265,6 +285,8 @@ def zfs_inherit(names=[], propname=None, recursive=False, revert=False):
 
 
 def dataset_exists(dataset):
+    if "#" not in dataset and is_lzc_available(lzc_exists):
+        return lzc_exists(dataset.encode("utf-8"))
     try:
         build(dataset)
         return True
@@ -320,8 +342,13 @@ def is_version_at_least(version_str: str, min_version_str: str) -> bool:
     return tuple(map(int, version_str.split("."))) >= tuple(map(int, min_version_str.split(".")))
 
 
+def is_lzc_available(lzc_function):
+    """libzfs_core ioctls run in-process and thus cannot be elevated via sudo; only use them if we are already root."""
+    return lzc_function is not None and len(sudo_cmd) == 0
+
+
 def is_solaris_zfs():
-    return platform.system() == "SunOS"
+    return solaris_zfs
 
 
 def run_cmd(*params, splitlines=True):